@@ -6,7 +6,7 @@ Runs all monitoring components simultaneously
 
 import os
 import sys
-import threading
+import multiprocessing
 import signal
 
 # Add src directory to path
@@ -17,9 +17,16 @@ from files.file_monitor import start_monitoring as start_file_monitor
 from process.process_monitor import ProcessMonitor
 
 
+def run_process_monitor(verbose=True):
+    """Process monitor entry point (runs in its own process)"""
+    process_monitor = ProcessMonitor(verbose=verbose)
+    process_monitor.monitor()
+
+
 class SovereignDefense:
-    def __init__(self):
+    def __init__(self, verbose_processes=True):
         self.running = True
+        self.verbose_processes = verbose_processes  # Log every new process, not just suspicious ones
         signal.signal(signal.SIGINT, self.signal_handler)
     
     def signal_handler(self, sig, frame):
@@ -41,20 +48,24 @@ class SovereignDefense:
         print("="*70)
         print("\nAll systems active. Press Ctrl+C to stop all monitors.\n")
         
-        # Start file monitor in a thread
-        file_thread = threading.Thread(
+        # Each monitor gets its own interpreter so they don't contend for the GIL.
+        # Spawned (not forked) so children start clean, without our threads or handlers
+        ctx = multiprocessing.get_context('spawn')
+        
+        # Start file monitor in a process
+        file_process = ctx.Process(
             target=start_file_monitor,
             daemon=True
         )
-        file_thread.start()
+        file_process.start()
         
-        # Start process monitor in a thread
-        process_monitor = ProcessMonitor()
-        process_thread = threading.Thread(
-            target=process_monitor.monitor,
+        # Start process monitor in a process
+        process_process = ctx.Process(
+            target=run_process_monitor,
+            args=(self.verbose_processes,),
             daemon=True
         )
-        process_thread.start()
+        process_process.start()
         
         # Start unified network monitor (blocks in main thread)
         network_monitor = UnifiedMonitor()
@@ -68,5 +79,6 @@ if __name__ == "__main__":
         print("Run with: sudo python3 sovereign_defense.py")
         sys.exit(1)
     
-    defense = SovereignDefense()
+    # --quiet: only log suspicious new processes
+    defense = SovereignDefense(verbose_processes='--quiet' not in sys.argv[1:])
     defense.start()
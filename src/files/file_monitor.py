@@ -7,7 +7,9 @@ Monitors file system for unauthorized access attempts
 import os
 import sys
 import time
-from datetime import datetime
+import threading
+from array import array
+from collections import OrderedDict
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
@@ -15,96 +17,318 @@ from watchdog.events import FileSystemEventHandler
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from network.alert_system import AlertSystem
 
+# Directories never worth watching (VCS metadata, dependencies, caches)
+IGNORED_DIRS = frozenset({'node_modules', '.git', '__pycache__', '.cache', '.venv'})
+
+# Beyond this many separate watches per monitored path, watch it recursively instead
+MAX_WATCHES_PER_PATH = 64
+
+
+def plan_watches(root):
+    """Split a directory tree into (path, recursive) watches that skip ignored directories"""
+    # Walk the tree once with scandir (no extra stat per entry),
+    # pruning ignored subtrees and noting which directories sit above one
+    children = {}
+    parent = {root: None}
+    above_ignored = set()
+    stack = [root]
+    
+    while stack:
+        directory = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    if entry.name in IGNORED_DIRS:
+                        ancestor = directory
+                        while ancestor is not None and ancestor not in above_ignored:
+                            above_ignored.add(ancestor)
+                            ancestor = parent[ancestor]
+                    else:
+                        subdirs.append(entry.path)
+                        parent[entry.path] = directory
+        except OSError:
+            pass  # Unreadable directory - watch what we can
+        children[directory] = subdirs
+        stack.extend(subdirs)
+    
+    # Subtrees with nothing to ignore get a single recursive watch,
+    # directories above ignored ones are watched on their own
+    watches = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        if directory in above_ignored:
+            watches.append((directory, False))
+            stack.extend(children[directory])
+        else:
+            watches.append((directory, True))
+    
+    return watches
+
 
 class FileAccessMonitor(FileSystemEventHandler):
     def __init__(self, log_dir='logs', monitored_paths=None):
         self.log_dir = log_dir
         self.alert_system = AlertSystem(log_dir=log_dir)
+        self.log_writer = self.alert_system.log_writer
         self.monitored_paths = monitored_paths or []
         
         # Ensure log directory exists
         os.makedirs(self.log_dir, exist_ok=True)
         
-        # Track events to avoid duplicate alerts
-        self.recent_events = {}
+        # Track events to avoid duplicate alerts: last alert time per
+        # event key hash, in a fixed-size ring (collisions only suppress an alert)
+        self.recent_events = array('d', [0.0] * 16384)
+        self._recent_mask = len(self.recent_events) - 1
         self.event_window = 1  # seconds to consider events as duplicates
         
-    def log_file_event(self, event_type, path):
-        """Log file system events"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_message = f"[{timestamp}] {event_type}: {path}"
+        # Alert debouncing per path: the first alert goes out immediately,
+        # later ones within the window are coalesced and only the latest is sent
+        self.debounce_window = 0.5  # seconds
+        self._pending = {}  # path -> (message, severity, play_sound, event)
+        self._last_emit = OrderedDict()  # path -> time of last alert
+        self.max_tracked_events = 4096
+        self._pending_cond = threading.Condition()
+        threading.Thread(target=self._flush_pending_alerts, daemon=True).start()
+        
+        # Editor swap files, partial downloads and build output aren't worth alerting on
+        self._ignore_suffixes = ('.swp', '.tmp', '.part', '.crdownload', '.pyc')
+        self._ignore_substr = ('/.git/', '/node_modules/', '/__pycache__/')
+        self.max_alert_file_size = 50_000_000  # bytes - larger files are logged only
+        
+        # Directories watched without their subtree (see plan_watches)
+        self.observer = None
+        self.flat_watches = set()
         
-        # Write to file access log
-        log_file = os.path.join(self.log_dir, 'file_access.log')
-        with open(log_file, 'a') as f:
-            f.write(log_message + '\n')
+        # Directories created under a flat watch get their own recursive watch;
+        # each is an emitter thread with its own inotify instance, so keep them bounded
+        self.runtime_watches = {}  # path -> ObservedWatch
+        self.max_runtime_watches = 32
+        
+        # A failed schedule() leaks watchdog's inotify instance, so stop trying after a few
+        self.runtime_watch_failures = 0
+        self.max_runtime_watch_failures = 8
+        
+    def schedule_watches(self, observer, root):
+        """Watch a directory tree, skipping ignored subdirectories"""
+        self.observer = observer
+        
+        watches = plan_watches(root)
+        if len(watches) > MAX_WATCHES_PER_PATH:
+            # Too fragmented to split up - watch everything
+            watches = [(root, True)]
+        
+        for path, recursive in watches:
+            observer.schedule(self, path, recursive=recursive)
+            if not recursive:
+                self.flat_watches.add(path)
+    
+    def watch_new_directory(self, path):
+        """Watch a directory created under a flat watch (runs on the observer's thread)"""
+        if path in self.runtime_watches or self.runtime_watch_failures >= self.max_runtime_watch_failures:
+            return
+        if not os.path.isdir(path):
+            return  # Already removed again
+        if len(self.runtime_watches) >= self.max_runtime_watches:
+            print(f"⚠️  Too many new directories to watch, not watching: {path}")
+            return
+        
+        try:
+            self.runtime_watches[path] = self.observer.schedule(self, path, recursive=True)
+        except OSError as e:
+            # Removed meanwhile, or out of inotify instances - an exception
+            # here would kill the observer and with it all file monitoring
+            self.runtime_watch_failures += 1
+            print(f"⚠️  Could not watch new directory {path}: {e}")
+            if self.runtime_watch_failures >= self.max_runtime_watch_failures:
+                print("⚠️  Giving up on watching new directories under flat watches")
+    
+    def unwatch_directory(self, path):
+        """Drop the watch of a directory that was deleted or moved away"""
+        watch = self.runtime_watches.pop(path, None)
+        if watch is None:
+            return
+        try:
+            self.observer.unschedule(watch)
+        except (KeyError, OSError):
+            pass  # Emitter already gone
+    
+    def is_ignored(self, path):
+        """Check if a path is temp/build noise that should be skipped entirely"""
+        if path.endswith(self._ignore_suffixes):
+            return True
+        for substr in self._ignore_substr:
+            if substr in path:
+                return True
+        return False
+    
+    def log_file_event(self, event_type, path):
+        """Log file system events that don't alert (alerts carry their own record)"""
+        # Write to file access log (file_access.log + events.log)
+        self.log_writer.write_alert(self.log_dir, "INFO", 'file_access', f"{event_type}: {path}")
     
     def should_alert(self, event_key):
         """Check if we should alert (avoid spam from rapid events)"""
-        current_time = time.time()
+        current_time = time.monotonic()
+        slot = hash(event_key) & self._recent_mask
         
-        if event_key in self.recent_events:
-            if current_time - self.recent_events[event_key] < self.event_window:
-                return False
+        if current_time - self.recent_events[slot] < self.event_window:
+            return False
         
-        self.recent_events[event_key] = current_time
+        self.recent_events[slot] = current_time
         return True
     
+    def _mark_emitted(self, path, now):
+        """Remember when we last alerted for a path (caller holds the lock)"""
+        self._last_emit[path] = now
+        self._last_emit.move_to_end(path)
+        if len(self._last_emit) > self.max_tracked_events:
+            self._last_emit.popitem(last=False)
+    
+    def send_file_alert(self, message, severity, play_sound):
+        """Send an alert whose record also serves as the event's file_access.log entry"""
+        self.alert_system.send_alert(
+            message, severity=severity, play_sound=play_sound,
+            log_categories=('file_access', 'alerts')  # Tagged file_access in events.log
+        )
+    
+    def queue_alert(self, path, message, severity, play_sound, event):
+        """
+        Send an alert now, or coalesce it if this path alerted very recently
+        
+        event is the (event_type, path) to log instead if the alert ends up superseded.
+        """
+        now = time.monotonic()
+        
+        with self._pending_cond:
+            last = self._last_emit.get(path)
+            coalesce = path in self._pending or (last is not None and now - last < self.debounce_window)
+            if coalesce:
+                # Keep only the latest event; the flusher sends it
+                superseded = self._pending.get(path)
+                self._pending[path] = (message, severity, play_sound, event)
+                self._pending_cond.notify()
+            else:
+                self._mark_emitted(path, now)
+        
+        if not coalesce:
+            self.send_file_alert(message, severity, play_sound)
+        elif superseded is not None:
+            # Replaced before it was sent - keep it as a plain file event
+            self.log_file_event(*superseded[3])
+    
+    def _flush_pending_alerts(self):
+        """Background loop - send coalesced alerts once per debounce window"""
+        while True:
+            with self._pending_cond:
+                while not self._pending:
+                    self._pending_cond.wait()
+            
+            # Let the burst settle, then send the latest event per path
+            time.sleep(self.debounce_window)
+            
+            with self._pending_cond:
+                batch, self._pending = self._pending, {}
+                now = time.monotonic()
+                for path in batch:
+                    self._mark_emitted(path, now)
+            
+            for message, severity, play_sound, _ in batch.values():
+                self.send_file_alert(message, severity, play_sound)
+    
     def on_modified(self, event):
         """Handle file modification events"""
-        if event.is_directory:
+        if event.is_directory or self.is_ignored(event.src_path):
             return
         
-        self.log_file_event("MODIFIED", event.src_path)
+        # Huge files (downloads, images) change constantly while written - log only
+        try:
+            if os.stat(event.src_path).st_size > self.max_alert_file_size:
+                self.log_file_event("MODIFIED", event.src_path)
+                return
+        except OSError:
+            pass
         
         event_key = f"modified:{event.src_path}"
         if self.should_alert(event_key):
-            self.alert_system.send_alert(
+            self.queue_alert(
+                event.src_path,
                 f"File modified: {event.src_path}",
                 severity="FILE_MODIFIED",
-                play_sound=False  # Don't play sound for modifications (too noisy)
+                play_sound=False,  # Don't play sound for modifications (too noisy)
+                event=("MODIFIED", event.src_path)
             )
+        else:
+            self.log_file_event("MODIFIED", event.src_path)
     
     def on_created(self, event):
         """Handle file creation events"""
         if event.is_directory:
+            # New directories under a non-recursive watch need a watch of their own
+            parent = os.path.dirname(event.src_path)
+            name = os.path.basename(event.src_path)
+            if parent in self.flat_watches and name not in IGNORED_DIRS:
+                self.watch_new_directory(event.src_path)
             return
         
-        self.log_file_event("CREATED", event.src_path)
+        if self.is_ignored(event.src_path):
+            return
         
         event_key = f"created:{event.src_path}"
         if self.should_alert(event_key):
-            self.alert_system.send_alert(
+            self.queue_alert(
+                event.src_path,
                 f"File created: {event.src_path}",
                 severity="FILE_CREATED",
-                play_sound=False
+                play_sound=False,
+                event=("CREATED", event.src_path)
             )
+        else:
+            self.log_file_event("CREATED", event.src_path)
     
     def on_deleted(self, event):
         """Handle file deletion events - CRITICAL"""
         if event.is_directory:
+            # A recreated directory must get a fresh watch, not the dead one
+            self.unwatch_directory(event.src_path)
             return
         
-        self.log_file_event("DELETED", event.src_path)
+        if self.is_ignored(event.src_path):
+            return
         
         # File deletions are critical - always alert with sound
-        self.alert_system.send_alert(
+        self.queue_alert(
+            event.src_path,
             f"FILE DELETION DETECTED: {event.src_path}",
             severity="FILE_DELETED",
-            play_sound=True  # Sound alert for deletions
+            play_sound=True,  # Sound alert for deletions
+            event=("DELETED", event.src_path)
         )
     
     def on_moved(self, event):
         """Handle file move/rename events"""
         if event.is_directory:
+            # Watches follow a directory renamed under a flat watch
+            self.unwatch_directory(event.src_path)
+            parent = os.path.dirname(event.dest_path)
+            name = os.path.basename(event.dest_path)
+            if parent in self.flat_watches and name not in IGNORED_DIRS:
+                self.watch_new_directory(event.dest_path)
             return
         
-        self.log_file_event(f"MOVED from {event.src_path} to {event.dest_path}", "")
+        # Saving via temp file + rename lands on a real file, so only skip noise-to-noise moves
+        if self.is_ignored(event.src_path) and self.is_ignored(event.dest_path):
+            return
         
-        self.alert_system.send_alert(
+        self.queue_alert(
+            event.src_path,
             f"File moved: {event.src_path} -> {event.dest_path}",
             severity="FILE_MOVED",
-            play_sound=False
+            play_sound=False,
+            event=(f"MOVED from {event.src_path} to {event.dest_path}", "")
         )
 
 
@@ -142,19 +366,18 @@ def start_monitoring(paths_to_monitor=None):
     
     # Schedule monitoring for each path
     for path in paths_to_monitor:
-        observer.schedule(event_handler, path, recursive=True)
+        event_handler.schedule_watches(observer, path)
     
     # Start monitoring
     observer.start()
     
+    # Block until the observer exits (no periodic wakeups)
     try:
-        while True:
-            time.sleep(1)
+        observer.join()
     except KeyboardInterrupt:
         print("\n\n🛑 File Monitor Stopped")
         observer.stop()
-    
-    observer.join()
+        observer.join()
 
 
 if __name__ == "__main__":
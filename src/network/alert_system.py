@@ -7,51 +7,121 @@ Sends alerts via sound, desktop notifications, and terminal
 import os
 import sys
 import subprocess
-from datetime import datetime
+import threading
+import queue
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from log_writer import get_log_writer
+
+# Long-running PowerShell helper (WSL): shows a MessageBox for each "title|message" line on stdin
+NOTIFIER_SCRIPT = (
+    "Add-Type -AssemblyName System.Windows.Forms; "
+    "$in = New-Object System.IO.StreamReader([Console]::OpenStandardInput(), [System.Text.Encoding]::UTF8); "
+    "while (($line = $in.ReadLine()) -ne $null) { "
+    "$p = $line -split '\\|', 2; "
+    "[System.Windows.Forms.MessageBox]::Show($p[1], $p[0], 'OK', 'Warning') | Out-Null "
+    "}"
+)
 
 class AlertSystem:
     def __init__(self, log_dir='logs'):
         self.log_dir = log_dir
+        self.log_writer = get_log_writer()
         os.makedirs(self.log_dir, exist_ok=True)
+        
+        # Sounds are played by a worker thread so alerting never waits on them
+        self.sound_cooldown = 2  # Minimum seconds between sounds
+        self._last_sound = 0.0
+        self._sound_requests = queue.Queue()
+        threading.Thread(target=self._sound_worker, daemon=True).start()
+        
+        # Desktop notifier helper, started on first notification
+        self._notifier = None
+        self._notifier_available = True
+        self._notifier_lock = threading.Lock()
     
     def play_alert_sound(self):
-        """Play system alert sound with multiple beeps"""
-        try:
-            # Multiple beeps for attention
-            for i in range(3):
+        """Request an alert sound (bursts of alerts collapse into one)"""
+        self._sound_requests.put_nowait(None)
+    
+    def _sound_worker(self):
+        """Play queued sounds, at most one per cooldown period"""
+        while True:
+            self._sound_requests.get()
+            
+            # Collapse everything queued meanwhile into this one sound
+            while not self._sound_requests.empty():
+                self._sound_requests.get_nowait()
+            
+            now = time.monotonic()
+            if now - self._last_sound < self.sound_cooldown:
+                continue
+            self._last_sound = now
+            
+            try:
+                # Beep for attention
                 sys.stdout.write('\a')
                 sys.stdout.flush()
+                
+                # Also try to play system sound, without waiting for it
+                try:
+                    subprocess.Popen(
+                        ['paplay', '/usr/share/sounds/freedesktop/stereo/alarm-clock-elapsed.oga'],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                        start_new_session=True
+                    )
+                except OSError:
+                    pass
+            except Exception as e:
+                pass  # Sound not critical
+    
+    def _get_notifier(self):
+        """Get the running notifier helper, starting it if needed (None if unavailable)"""
+        with self._notifier_lock:
+            if not self._notifier_available:
+                return None
             
-            # Also try to play system sound
-            try:
-                subprocess.run(['paplay', '/usr/share/sounds/freedesktop/stereo/alarm-clock-elapsed.oga'], 
-                             check=False, stderr=subprocess.DEVNULL, timeout=2)
-            except:
-                pass
-        except Exception as e:
-            pass  # Sound not critical
+            if self._notifier is None or self._notifier.poll() is not None:
+                try:
+                    self._notifier = subprocess.Popen(
+                        ['powershell.exe', '-NoProfile', '-Command', NOTIFIER_SCRIPT],
+                        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                    )
+                except OSError:
+                    # Not on WSL - don't try again
+                    self._notifier_available = False
+                    return None
+                
+                # Never block alerting on a helper that is busy showing popups
+                os.set_blocking(self._notifier.stdin.fileno(), False)
+            
+            return self._notifier
     
     def send_desktop_notification(self, title, message, urgency='critical'):
         """Send desktop notification that appears over all windows"""
         try:
-            # For WSL - use Windows MessageBox (works reliably)
-            # Remove exclamation marks and quotes to avoid bash issues
-            clean_title = title.replace('!', '').replace('"', "'")
-            clean_message = message.replace('!', '').replace('"', "'")[:200]
+            # For WSL - use Windows MessageBox (works reliably) via one long-lived PowerShell
+            notifier = self._get_notifier()
+            if notifier is None:
+                return
+            
+            # One line per notification, "|" separates title and message
+            clean_title = title.replace('|', '/').replace('\n', ' ').replace('\r', ' ')
+            clean_message = message.replace('\n', ' ').replace('\r', ' ')[:200]
+            line = f"{clean_title}|{clean_message}\n".encode()
             
-            subprocess.Popen([
-                'powershell.exe',
-                '-Command',
-                f"Add-Type -AssemblyName System.Windows.Forms; [System.Windows.Forms.MessageBox]::Show('{clean_message}', '{clean_title}', 'OK', 'Warning')"
-            ], stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            # Small pipe writes are atomic: either the whole line goes or nothing does
+            try:
+                os.write(notifier.stdin.fileno(), line)
+            except BlockingIOError:
+                pass  # Helper backed up with unanswered popups - drop this one
             
         except Exception as e:
             pass  # Notifications not critical if unavailable
     
-    def send_alert(self, message, severity="ALERT", play_sound=True, notify=True):
-        """Send multi-channel alert"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
+    def send_alert(self, message, severity="ALERT", play_sound=True, notify=True, log_categories=('alerts',)):
+        """Send multi-channel alert (log_categories: logs the record goes to besides events.log)"""
         # 1. Play sound (with beeps)
         if play_sound:
             self.play_alert_sound()
@@ -68,11 +138,8 @@ class AlertSystem:
         print(f"🚨 {severity}: {message}")
         print(f"{'='*70}\n")
         
-        # 4. Log to file
-        log_message = f"[{timestamp}] [{severity}] {message}"
-        log_file = os.path.join(self.log_dir, 'alerts.log')
-        with open(log_file, 'a') as f:
-            f.write(log_message + '\n')
+        # 4. Log to file (alerts.log + events.log by default)
+        self.log_writer.write_alert(self.log_dir, severity, log_categories, message)
 
 if __name__ == "__main__":
     # Test the alert system
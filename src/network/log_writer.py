@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Log Writer - Buffered log output
+Keeps log files open and writes queued lines in batches from a background thread
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import deque
+
+
+class _TsCache:
+    """Formatted local time, recomputed only when the second changes"""
+    __slots__ = ('cached',)
+    
+    def __init__(self):
+        self.cached = (None, '')
+    
+    def get(self):
+        now = int(time.time())
+        second, formatted = self.cached
+        if now != second:
+            formatted = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+            # Single assignment keeps second and string consistent across threads
+            self.cached = (now, formatted)
+        return formatted
+
+
+_ts = _TsCache()
+
+
+def timestamp():
+    """Current local time as 'YYYY-MM-DD HH:MM:SS' (cached per second)"""
+    return _ts.get()
+
+
+class LogWriter:
+    def __init__(self, flush_interval=0.1, buffer_size=1 << 16):
+        self.flush_interval = flush_interval  # seconds between flushes
+        self.buffer_size = buffer_size
+        
+        # One long-lived handle per log file
+        self._files = {}
+        
+        # Pending (path, line) pairs waiting for the next flush
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        
+        # Paths whose last write failed (reported once until they recover)
+        self._failed_paths = set()
+        
+        # Don't lose the last batch on shutdown
+        atexit.register(self.close)
+    
+    def write(self, path, line):
+        """Queue a line (bytes) to be appended to a log file"""
+        with self._lock:
+            self._queue.append((path, line))
+            self._start_flusher()
+    
+    def write_alert(self, log_dir, severity, category, message):
+        """
+        Write one event record to its category log(s) and the combined events.log
+        
+        category may be a tuple of categories, most specific first; the record is
+        tagged with the first and appended once to each category's log.
+        """
+        categories = (category,) if isinstance(category, str) else category
+        
+        # Line protocol: severity<TAB>category<TAB>timestamp<TAB>message
+        message = message.replace('\t', ' ').replace('\n', ' ')
+        record = f"{severity}\t{categories[0]}\t{_ts.get()}\t{message}\n".encode()
+        
+        # Serialized once, queued for every file in the same batch
+        with self._lock:
+            for name in categories:
+                self._queue.append((os.path.join(log_dir, f"{name}.log"), record))
+            self._queue.append((os.path.join(log_dir, 'events.log'), record))
+            self._start_flusher()
+    
+    def _start_flusher(self):
+        """Start the flush thread on first use (caller holds the lock)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        """Background loop - flush queued lines periodically"""
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+    
+    def flush(self):
+        """Write all queued lines, one write per log file"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._queue = self._queue, deque()
+            
+            if not batch:
+                return
+            
+            # Group lines by file, keeping their order
+            lines_by_path = {}
+            for path, line in batch:
+                lines_by_path.setdefault(path, []).append(line)
+            
+            for path, lines in lines_by_path.items():
+                # One bad log (missing dir, no permission, disk full) must not stop the others
+                try:
+                    f = self._files.get(path)
+                    if f is None:
+                        f = open(path, 'ab', buffering=self.buffer_size)
+                        self._files[path] = f
+                    f.write(b''.join(lines))
+                    f.flush()
+                except OSError as e:
+                    self._drop_file(path)
+                    if path not in self._failed_paths:
+                        self._failed_paths.add(path)
+                        print(f"⚠️  Log write failed, dropping {len(lines)} line(s) for {path}: {e}")
+                    continue
+                self._failed_paths.discard(path)
+    
+    def _drop_file(self, path):
+        """Forget a log file's handle so the next flush reopens it"""
+        f = self._files.pop(path, None)
+        if f is not None:
+            try:
+                f.close()
+            except OSError:
+                pass  # Buffered bytes that already failed to write
+    
+    def close(self):
+        """Flush pending lines and close all log files"""
+        self.flush()
+        with self._flush_lock:
+            for path in list(self._files):
+                self._drop_file(path)
+
+
+_log_writer = LogWriter()
+
+
+def get_log_writer():
+    """Get the log writer shared by all monitors in this process"""
+    return _log_writer
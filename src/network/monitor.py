@@ -6,20 +6,66 @@ Detects INBOUND connection attempts and attacks against YOUR machine
 
 import psutil
 import time
-from datetime import datetime
 import os
+import sys
 import socket
+from collections import OrderedDict
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from log_writer import get_log_writer, timestamp
+from sock_diag import SocketTable
+
+_inet_aton = socket.inet_aton
+
+
+def ipv4_to_int(ip):
+    """Convert a dotted IPv4 address to an int (None if not IPv4)"""
+    try:
+        return int.from_bytes(_inet_aton(ip), 'big')
+    except OSError:
+        return None
 
 class NetworkMonitor:
     def __init__(self, log_dir='logs'):
         self.log_dir = log_dir
-        self.local_ips = self.get_local_ips()
+        self.log_writer = get_log_writer()
+        self.local_ips = frozenset(self.get_local_ips())
+        self._local_ints = frozenset(ipv4_to_int(ip) for ip in self.local_ips)
+        
+        # Special IPv4 ranges as (network, mask, kind), checked with a bitwise AND
+        self._nets = [
+            (0x7F000000, 0xFF000000, 'loopback'),   # 127.0.0.0/8
+            (0x0A000000, 0xFF000000, 'private'),    # 10.0.0.0/8
+            (0xAC100000, 0xFFF00000, 'private'),    # 172.16.0.0/12
+            (0xC0A80000, 0xFFFF0000, 'private'),    # 192.168.0.0/16
+            (0xE0000000, 0xF0000000, 'multicast'),  # 224.0.0.0/4
+        ]
+        # Never a real remote peer. Private ranges still count: on shared
+        # WiFi the attacker is usually on the same LAN
+        self._not_inbound = ('loopback', 'multicast')
+        
+        # Cache of pid -> (process name, lookup time) to avoid /proc hits per connection
+        self._proc_name_cache = {}
+        self.proc_name_ttl = 5.0  # seconds
+        
+        # List sockets over netlink where available (Linux), psutil otherwise
+        try:
+            self.socket_table = SocketTable()
+        except (OSError, AttributeError):
+            self.socket_table = None
+        
+        # Connections already analyzed: key -> last time seen (oldest first)
+        self.seen_connections = OrderedDict()
+        self.seen_max_entries = 50000
+        self.seen_ttl = 600  # Forget connections not seen for 10 minutes
+        self.seen_sweep_interval = 60  # seconds
+        self._last_sweep = time.monotonic()
         
         # Ensure log directory exists
         os.makedirs(self.log_dir, exist_ok=True)
         
         print(f"🔍 Your machine IPs: {', '.join(self.local_ips)}")
-        
+    
     def get_local_ips(self):
         """Get all local IP addresses of this machine"""
         local_ips = set()
@@ -32,108 +78,178 @@ class NetworkMonitor:
         
         return local_ips
     
+    def _proc_name(self, pid):
+        """Get process name for a pid, cached for a few seconds"""
+        if not pid:
+            return "Unknown"
+        
+        now = time.monotonic()
+        cached = self._proc_name_cache.get(pid)
+        if cached and now - cached[1] < self.proc_name_ttl:
+            return cached[0]
+        
+        try:
+            name = psutil.Process(pid).name()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            name = "Unknown"
+        
+        # Drop expired entries so the cache doesn't grow with dead pids
+        if len(self._proc_name_cache) > 1024:
+            self._proc_name_cache = {
+                p: entry for p, entry in self._proc_name_cache.items()
+                if now - entry[1] < self.proc_name_ttl
+            }
+        
+        self._proc_name_cache[pid] = (name, now)
+        return name
+    
+    def list_connections(self):
+        """Get all current TCP/UDP connections"""
+        if self.socket_table:
+            try:
+                return self.socket_table.connections()
+            except OSError:
+                # Netlink unusable here - stick with psutil from now on
+                self.socket_table = None
+        return psutil.net_connections(kind='inet')
+    
+    @staticmethod
+    def connection_key(conn):
+        """Build a hashable identifier for a connection"""
+        _, _, _, laddr, raddr, status, _ = conn
+        local_ip, local_port = laddr
+        remote_ip, remote_port = raddr or (None, None)
+        return (local_ip, local_port, remote_ip, remote_port, status)
+    
+    def remember_connections(self, conn_ids, now):
+        """Mark connections as seen, bounding memory to active flows"""
+        seen = self.seen_connections
+        for conn_id in conn_ids:
+            seen[conn_id] = now
+            seen.move_to_end(conn_id)
+        
+        # Hard cap: evict least recently seen
+        while len(seen) > self.seen_max_entries:
+            seen.popitem(last=False)
+        
+        # Periodically forget connections that have gone away
+        if now - self._last_sweep >= self.seen_sweep_interval:
+            self._last_sweep = now
+            while seen:
+                conn_id, last_seen = next(iter(seen.items()))
+                if now - last_seen < self.seen_ttl:
+                    break
+                seen.popitem(last=False)
+    
+    def _is_special(self, ip_int):
+        """Get the kind of special range an IPv4 int falls in (None for public addresses)"""
+        for net, mask, kind in self._nets:
+            if (ip_int & mask) == net:
+                return kind
+        return None
+    
     def log_alert(self, message, severity="ALERT"):
         """Write alert to log file and print to console"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_message = f"[{timestamp}] [{severity}] {message}"
-        
         # Print to console with visual emphasis
         print(f"\n{'='*70}")
         print(f"🚨 {severity}: {message}")
         print(f"{'='*70}\n")
         
-        # Write to log file
-        log_file = os.path.join(self.log_dir, 'network_alerts.log')
-        with open(log_file, 'a') as f:
-            f.write(log_message + '\n')
+        # Write to log file (network_alerts.log + events.log)
+        self.log_writer.write_alert(self.log_dir, severity, 'network_alerts', message)
     
     def log_connection(self, conn_info):
         """Log every connection for evidence"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_message = f"[{timestamp}] {conn_info}"
+        log_message = f"[{timestamp()}] {conn_info}"
         
         # Write to detailed connection log
         log_file = os.path.join(self.log_dir, 'all_connections.log')
-        with open(log_file, 'a') as f:
-            f.write(log_message + '\n')
+        self.log_writer.write(log_file, f"{log_message}\n".encode())
     
-    def is_listening_port(self, conn):
+    def is_listening_port(self, status):
         """Check if this is a listening port (potential target for attacks)"""
-        return conn.status == 'LISTEN'
+        return status == 'LISTEN'
     
-    def is_inbound_connection(self, conn):
+    def is_inbound_connection(self, status, local_ip, remote_ip):
         """Detect if this is someone connecting TO us (inbound threat)"""
         # If we're listening and someone connects, that's inbound
-        if conn.status == 'ESTABLISHED':
+        if status == 'ESTABLISHED':
             # Check if local address is one of our IPs and we have a remote address
-            if conn.laddr and conn.raddr:
-                local_ip = conn.laddr.ip
-                remote_ip = conn.raddr.ip
-                
+            if local_ip and remote_ip:
                 # If remote IP is trying to reach our listening service
                 # AND it's not localhost, it's potentially suspicious
-                if local_ip in self.local_ips and remote_ip not in self.local_ips:
-                    # Filter out localhost connections
-                    if not remote_ip.startswith('127.'):
+                if local_ip in self.local_ips:
+                    remote_int = ipv4_to_int(remote_ip)
+                    if remote_int is None or remote_int in self._local_ints:
+                        return False
+                    
+                    # Filter out localhost and multicast
+                    if self._is_special(remote_int) not in self._not_inbound:
                         return True
         return False
     
     def analyze_connection(self, conn):
         """Analyze a connection for threats"""
-        try:
-            # Get connection details
-            if conn.laddr:
-                local_addr = f"{conn.laddr.ip}:{conn.laddr.port}"
-            else:
-                local_addr = "N/A"
-            
-            if conn.raddr:
-                remote_addr = f"{conn.raddr.ip}:{conn.raddr.port}"
-                remote_ip = conn.raddr.ip
-            else:
-                remote_addr = "N/A"
-                remote_ip = None
-            
-            status = conn.status
-            pid = conn.pid
-            
-            # Get process name if available
-            try:
-                if pid:
-                    process = psutil.Process(pid)
-                    process_name = process.name()
-                else:
-                    process_name = "Unknown"
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                process_name = "Unknown"
-            
-            conn_info = (
-                f"Local: {local_addr} | Remote: {remote_addr} | "
-                f"Status: {status} | Process: {process_name} (PID: {pid})"
+        # Get connection details (unpacked once instead of attribute lookups)
+        _, _, _, laddr, raddr, status, pid = conn
+        local_ip, local_port = laddr or (None, None)
+        remote_ip, remote_port = raddr or (None, None)
+        
+        local_addr = f"{local_ip}:{local_port}" if laddr else "N/A"
+        remote_addr = f"{remote_ip}:{remote_port}" if raddr else "N/A"
+        
+        # Get process name if available
+        process_name = self._proc_name(pid)
+        
+        conn_info = (
+            f"Local: {local_addr} | Remote: {remote_addr} | "
+            f"Status: {status} | Process: {process_name} (PID: {pid})"
+        )
+        
+        # Log every connection for evidence
+        self.log_connection(conn_info)
+        
+        # Check for inbound threats
+        if self.is_inbound_connection(status, local_ip, remote_ip):
+            kind = self._is_special(ipv4_to_int(remote_ip))
+            network = f" ({kind} network)" if kind else ""
+            self.log_alert(
+                f"INBOUND CONNECTION DETECTED - "
+                f"Remote IP: {remote_ip}{network} attempting to connect to your machine at {local_addr} | "
+                f"Process: {process_name} (PID: {pid})",
+                severity="THREAT"
             )
-            
-            # Log every connection for evidence
-            self.log_connection(conn_info)
-            
-            # Check for inbound threats
-            if self.is_inbound_connection(conn):
-                self.log_alert(
-                    f"INBOUND CONNECTION DETECTED - "
-                    f"Remote IP: {remote_ip} attempting to connect to your machine at {local_addr} | "
-                    f"Process: {process_name} (PID: {pid})",
-                    severity="THREAT"
-                )
-                return True
-            
-            # Check for listening ports (potential attack surface)
-            if self.is_listening_port(conn):
-                print(f"⚠️  Listening port detected: {local_addr} (Process: {process_name})")
-                
-        except Exception as e:
-            print(f"Error analyzing connection: {e}")
+            return True
+        
+        # Check for listening ports (potential attack surface)
+        if self.is_listening_port(status):
+            print(f"⚠️  Listening port detected: {local_addr} (Process: {process_name})")
         
         return False
     
+    def analyze_connections(self, connections):
+        """Analyze a batch of new connections"""
+        for conn in connections:
+            # One bad connection must not stop the rest of the batch being logged
+            try:
+                self.analyze_connection(conn)
+            except Exception as e:
+                print(f"Error analyzing connection: {e}")
+    
+    def check_connections(self):
+        """Analyze connections that appeared since the last check"""
+        # One snapshot per tick, keyed by connection identifier
+        current = {
+            self.connection_key(conn): conn
+            for conn in self.list_connections()
+            if conn.laddr
+        }
+        
+        # Only analyze new connections (remembered first, so a failure isn't retried every tick)
+        new_connections = current.keys() - self.seen_connections.keys()
+        self.remember_connections(current, time.monotonic())
+        self.analyze_connections(current[conn_id] for conn_id in new_connections)
+    
     def monitor(self, interval=1):
         """Main monitoring loop - checks every second for threats"""
         print("\n🛡️  SOVEREIGN NETWORK DEFENSE - ACTIVE")
@@ -144,32 +260,15 @@ class NetworkMonitor:
         print("="*70)
         print("\nPress Ctrl+C to stop\n")
         
-        seen_connections = set()
-        
         try:
             while True:
-                connections = psutil.net_connections(kind='inet')
-                
-                for conn in connections:
-                    # Create unique identifier for this connection
-                    try:
-                        if conn.laddr and conn.raddr:
-                            conn_id = f"{conn.laddr.ip}:{conn.laddr.port}-{conn.raddr.ip}:{conn.raddr.port}-{conn.status}"
-                        elif conn.laddr:
-                            conn_id = f"{conn.laddr.ip}:{conn.laddr.port}-{conn.status}"
-                        else:
-                            continue
-                        
-                        # Only analyze new connections
-                        if conn_id not in seen_connections:
-                            seen_connections.add(conn_id)
-                            self.analyze_connection(conn)
-                    
-                    except Exception as e:
-                        continue
+                try:
+                    self.check_connections()
+                except Exception as e:
+                    print(f"Error analyzing connections: {e}")
                 
                 time.sleep(interval)
-                
+        
         except KeyboardInterrupt:
             print("\n\n🛑 Network Monitor Stopped")
             print(f"All logs saved to: {os.path.abspath(self.log_dir)}/")
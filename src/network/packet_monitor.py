@@ -4,35 +4,110 @@ Packet Monitor - Enhanced Detection
 Captures and analyzes network packets to detect port scans and attack attempts
 """
 
-from scapy.all import sniff, IP, TCP, UDP
-from datetime import datetime
-from collections import defaultdict
 import time
 import os
 import sys
+import socket
+import struct
+import ctypes
+import mmap
+import select
+from collections import OrderedDict
 
 # Import alert system
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from alert_system import AlertSystem
+from log_writer import timestamp
+from scan_detector import ScanDetector
+
+# Linux packet socket constants (linux/if_ether.h, linux/if_packet.h)
+ETH_P_IP = 0x0800
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V2 = 1
+TP_STATUS_USER = 1
+SO_ATTACH_FILTER = 26
+
+# Ring buffer layout: 32 blocks of 64 KiB, 2 KiB per frame (headers fit easily)
+RING_BLOCK_SIZE = 1 << 16
+RING_BLOCK_COUNT = 32
+RING_FRAME_SIZE = 1 << 11
+RING_FRAME_COUNT = RING_BLOCK_SIZE // RING_FRAME_SIZE * RING_BLOCK_COUNT
+
+# struct tpacket2_hdr: tp_status, tp_len, tp_snaplen, tp_mac, tp_net
+TPACKET2_HDR = struct.Struct('IIIHH')
+
+# Classic BPF run in the kernel on each IPv4 packet (offset 0 = IP header).
+# Equivalent to: (tcp[tcpflags] & tcp-syn != 0 or udp) and not ip fragment
+# Everything else is dropped before it is copied to userland.
+CAPTURE_FILTER = [
+    (0x28, 0, 0, 6),            # ldh [6]              flags + fragment offset
+    (0x45, 7, 0, 0x1fff),       # jset #0x1fff         fragment -> drop
+    (0x30, 0, 0, 9),            # ldb [9]              protocol
+    (0x15, 4, 0, 17),           # jeq #17              UDP -> accept
+    (0x15, 0, 4, 6),            # jeq #6               not TCP -> drop
+    (0xb1, 0, 0, 0),            # ldxb 4*([0]&0xf)     IP header length
+    (0x50, 0, 0, 13),           # ldb [x+13]           TCP flags
+    (0x45, 0, 1, 0x02),         # jset #0x02           SYN -> accept
+    (0x06, 0, 0, 0x40000),      # ret #262144          accept
+    (0x06, 0, 0, 0),            # ret #0               drop
+]
+
+# Precompiled header layouts
+IP_FIELDS = struct.Struct('!9xB2xII')   # protocol, source, destination
+PORTS = struct.Struct('!HH')            # source port, destination port (TCP and UDP)
+TCP_FLAGS_OFFSET = 13
+TCP_SYN = 0x02
+
+
+def parse_packet(packet):
+    """Parse an IPv4 packet into (protocol, src, dst, src_port, dst_port, tcp_flags)"""
+    if len(packet) < 20:
+        return None
+    
+    header_len = (packet[0] & 0x0F) << 2
+    protocol, src, dst = IP_FIELDS.unpack_from(packet)
+    
+    if protocol == socket.IPPROTO_TCP:
+        if len(packet) < header_len + TCP_FLAGS_OFFSET + 1:
+            return None
+        src_port, dst_port = PORTS.unpack_from(packet, header_len)
+        return protocol, src, dst, src_port, dst_port, packet[header_len + TCP_FLAGS_OFFSET]
+    
+    if protocol == socket.IPPROTO_UDP:
+        if len(packet) < header_len + PORTS.size:
+            return None
+        src_port, dst_port = PORTS.unpack_from(packet, header_len)
+        return protocol, src, dst, src_port, dst_port, 0
+    
+    return None
+
+
+def format_ip(address):
+    """Format an IPv4 address packed as int in dotted notation"""
+    return socket.inet_ntoa(address.to_bytes(4, 'big'))
+
 
 class PacketMonitor:
     def __init__(self, log_dir='logs', alert_callback=None):
         self.log_dir = log_dir
         self.alert_callback = alert_callback
         self.alert_system = AlertSystem(log_dir=log_dir)
-        
-        # Track connection attempts per source IP
-        self.scan_tracker = defaultdict(lambda: {
-            'syn_count': 0,
-            'ports': set(),
-            'first_seen': None,
-            'last_seen': None
-        })
+        self.log_writer = self.alert_system.log_writer
         
         # Detection thresholds
         self.port_scan_threshold = 5  # Different ports from same IP
         self.time_window = 10  # Seconds
         
+        # Track connection attempts per source IP
+        self.scan_detector = ScanDetector(time_window=self.time_window)
+        
+        # At most one port scan alert per source per cooldown (LRU, oldest first)
+        self.alert_cooldown = 30  # Seconds
+        self.max_alert_sources = 4096
+        self._last_alert = OrderedDict()
+        
         # Ensure log directory exists
         os.makedirs(self.log_dir, exist_ok=True)
         
@@ -47,49 +122,39 @@ class PacketMonitor:
     
     def log_packet(self, packet_info):
         """Log detailed packet information"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_message = f"[{timestamp}] {packet_info}"
+        log_message = f"[{timestamp()}] {packet_info}"
         
         log_file = os.path.join(self.log_dir, 'all_packets.log')
-        with open(log_file, 'a') as f:
-            f.write(log_message + '\n')
+        self.log_writer.write(log_file, f"{log_message}\n".encode())
     
     def analyze_packet(self, packet):
-        """Analyze individual packet for threats"""
+        """Analyze individual IPv4 packet (raw bytes from the IP header on) for threats"""
         try:
-            # Only analyze IP packets
-            if not packet.haslayer(IP):
+            fields = parse_packet(packet)
+            if fields is None:
                 return
             
-            src_ip = packet[IP].src
-            dst_ip = packet[IP].dst
+            protocol, src_ip, dst_ip, src_port, dst_port, flags = fields
             
             # Check for TCP packets (most common for port scans)
-            if packet.haslayer(TCP):
-                src_port = packet[TCP].sport
-                dst_port = packet[TCP].dport
-                flags = packet[TCP].flags
-                
+            if protocol == socket.IPPROTO_TCP:
                 # Detect SYN packets (connection attempts)
-                if flags & 0x02:  # SYN flag set
+                if flags & TCP_SYN:
                     self.detect_port_scan(src_ip, dst_ip, dst_port, 'TCP')
                     
                     packet_info = (
-                        f"SYN | Source: {src_ip}:{src_port} -> "
-                        f"Dest: {dst_ip}:{dst_port} | Protocol: TCP"
+                        f"SYN | Source: {format_ip(src_ip)}:{src_port} -> "
+                        f"Dest: {format_ip(dst_ip)}:{dst_port} | Protocol: TCP"
                     )
                     self.log_packet(packet_info)
             
             # Check for UDP packets
-            elif packet.haslayer(UDP):
-                src_port = packet[UDP].sport
-                dst_port = packet[UDP].dport
-                
+            else:
                 self.detect_port_scan(src_ip, dst_ip, dst_port, 'UDP')
                 
                 packet_info = (
-                    f"UDP | Source: {src_ip}:{src_port} -> "
-                    f"Dest: {dst_ip}:{dst_port} | Protocol: UDP"
+                    f"UDP | Source: {format_ip(src_ip)}:{src_port} -> "
+                    f"Dest: {format_ip(dst_ip)}:{dst_port} | Protocol: UDP"
                 )
                 self.log_packet(packet_info)
                 
@@ -97,60 +162,108 @@ class PacketMonitor:
             print(f"Error analyzing packet: {e}")
     
     def detect_port_scan(self, src_ip, dst_ip, dst_port, protocol):
-        """Detect port scanning behavior"""
+        """Detect port scanning behavior (IPs packed as int)"""
         current_time = time.time()
         
-        # Initialize tracking if first time seeing this IP
-        if self.scan_tracker[src_ip]['first_seen'] is None:
-            self.scan_tracker[src_ip]['first_seen'] = current_time
+        # Check if threshold exceeded
+        unique_ports = self.scan_detector.observe(src_ip, dst_port, current_time)
+        if unique_ports < self.port_scan_threshold:
+            return
         
-        self.scan_tracker[src_ip]['last_seen'] = current_time
-        self.scan_tracker[src_ip]['ports'].add(dst_port)
+        # Same scanner alerted recently - start counting again, quietly
+        if current_time - self._last_alert.get(src_ip, 0) < self.alert_cooldown:
+            self.scan_detector.reset(src_ip, current_time)
+            return
         
-        # Clean old entries outside time window
-        if current_time - self.scan_tracker[src_ip]['first_seen'] > self.time_window:
-            # Reset tracking for this IP
-            self.scan_tracker[src_ip] = {
-                'syn_count': 0,
-                'ports': {dst_port},
-                'first_seen': current_time,
-                'last_seen': current_time
-            }
+        self._last_alert[src_ip] = current_time
+        self._last_alert.move_to_end(src_ip)
+        if len(self._last_alert) > self.max_alert_sources:
+            self._last_alert.popitem(last=False)
         
-        # Check if threshold exceeded
-        unique_ports = len(self.scan_tracker[src_ip]['ports'])
-        if unique_ports >= self.port_scan_threshold:
-            ports_list = sorted(list(self.scan_tracker[src_ip]['ports']))
-            time_span = current_time - self.scan_tracker[src_ip]['first_seen']
+        ports_list = self.scan_detector.ports(src_ip)
+        time_span = current_time - self.scan_detector.first_seen[src_ip]
+        
+        self.log_alert(
+            f"PORT SCAN DETECTED | Source: {format_ip(src_ip)} -> Target: {format_ip(dst_ip)} | "
+            f"Scanned {unique_ports} ports in {time_span:.1f}s | "
+            f"Ports: {ports_list[:10]}{'...' if len(ports_list) > 10 else ''} | "
+            f"Protocol: {protocol}",
+            severity="PORT_SCAN"
+        )
+        
+        # Reset after alert to avoid spam
+        self.scan_detector.reset(src_ip, current_time)
+    
+    def open_capture_socket(self, interface=None):
+        """Open a packet socket delivering IPv4 packets that pass the kernel filter"""
+        # SOCK_DGRAM strips the link-layer header, so data starts at the IP header
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(ETH_P_IP))
+        
+        # Attach the BPF program (struct sock_fprog { len; *filter })
+        program = b''.join(struct.pack('HBBI', *insn) for insn in CAPTURE_FILTER)
+        self._filter_buffer = ctypes.create_string_buffer(program)
+        fprog = struct.pack('HL', len(CAPTURE_FILTER), ctypes.addressof(self._filter_buffer))
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+        
+        if interface:
+            sock.bind((interface, ETH_P_IP))
+        
+        return sock
+    
+    def capture_ring(self, sock):
+        """Read packets from a PACKET_MMAP ring shared with the kernel"""
+        try:
+            sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+            sock.setsockopt(SOL_PACKET, PACKET_RX_RING, struct.pack(
+                'IIII', RING_BLOCK_SIZE, RING_BLOCK_COUNT, RING_FRAME_SIZE, RING_FRAME_COUNT
+            ))
+            ring = mmap.mmap(sock.fileno(), RING_BLOCK_SIZE * RING_BLOCK_COUNT)
+        except OSError:
+            # No ring support - fall back to plain reads
+            return self.capture_recv(sock)
+        
+        frames = memoryview(ring)
+        
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        
+        frame = 0
+        while True:
+            offset = frame * RING_FRAME_SIZE
+            status, _, snaplen, _, net = TPACKET2_HDR.unpack_from(frames, offset)
             
-            self.log_alert(
-                f"PORT SCAN DETECTED | Source: {src_ip} -> Target: {dst_ip} | "
-                f"Scanned {unique_ports} ports in {time_span:.1f}s | "
-                f"Ports: {ports_list[:10]}{'...' if len(ports_list) > 10 else ''} | "
-                f"Protocol: {protocol}",
-                severity="PORT_SCAN"
-            )
+            # Sleep in the kernel until it hands us a frame
+            if not status & TP_STATUS_USER:
+                poller.poll(1000)
+                continue
             
-            # Reset after alert to avoid spam
-            self.scan_tracker[src_ip]['ports'] = set()
-            self.scan_tracker[src_ip]['first_seen'] = current_time
+            start = offset + net
+            self.analyze_packet(frames[start:start + snaplen])
+            
+            # Give the frame back to the kernel
+            struct.pack_into('I', frames, offset, 0)
+            frame = (frame + 1) % RING_FRAME_COUNT
+    
+    def capture_recv(self, sock):
+        """Read packets one recv() at a time (kernels without PACKET_MMAP)"""
+        buffer = bytearray(RING_FRAME_SIZE)
+        view = memoryview(buffer)
+        while True:
+            size = sock.recv_into(buffer)
+            self.analyze_packet(view[:size])
     
-    def start_sniffing(self, interface=None, filter_exp="tcp or udp"):
+    def start_sniffing(self, interface=None):
         """Start packet capture"""
         print("🔍 Packet Monitor Started")
         print(f"Capturing on interface: {interface if interface else 'all'}")
-        print(f"Filter: {filter_exp}")
+        print("Filter: TCP SYN or UDP (kernel BPF)")
         print(f"Port scan threshold: {self.port_scan_threshold} ports in {self.time_window}s")
         print(f"Logs: {os.path.abspath(self.log_dir)}")
         print("\nPress Ctrl+C to stop\n")
         
         try:
-            sniff(
-                iface=interface,
-                filter=filter_exp,
-                prn=self.analyze_packet,
-                store=False  # Don't store packets in memory
-            )
+            sock = self.open_capture_socket(interface)
+            self.capture_ring(sock)
         except KeyboardInterrupt:
             print("\n\n🛑 Packet Monitor Stopped")
             print(f"Logs saved to: {os.path.abspath(self.log_dir)}/")
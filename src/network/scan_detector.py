@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Scan Detector - Port scan state tracking
+Per-packet hot path for port scan detection, kept free of alerting and formatting
+"""
+
+# One bit per TCP/UDP port
+PORT_BITMAP_BYTES = 65536 // 8
+
+
+class ScanDetector:
+    __slots__ = ('time_window', 'max_sources', 'first_seen', 'port_count', 'port_bitmap', '_last_prune')
+    
+    def __init__(self, time_window=10, max_sources=4096):
+        self.time_window = time_window  # Seconds
+        self.max_sources = max_sources  # Bounds memory under spoofed-source floods
+        
+        # Parallel tables keyed by source IP: window start, unique port count, ports seen.
+        # Ports seen is a single port (int) until a second distinct port arrives, then an
+        # 8 KiB bitmap - most sources never touch more than one port.
+        self.first_seen = {}
+        self.port_count = {}
+        self.port_bitmap = {}
+        self._last_prune = 0.0
+    
+    def observe(self, src_ip, dst_port, now):
+        """Record a connection attempt, returning the unique port count (0 if port already seen)"""
+        # Periodically drop idle sources so tracking memory stays bounded
+        if now - self._last_prune > self.time_window:
+            self._last_prune = now
+            self.prune(now)
+        
+        first_seen = self.first_seen.get(src_ip)
+        if first_seen is None:
+            # First time seeing this IP
+            if len(self.first_seen) >= self.max_sources:
+                # Table full - drop the oldest-tracked source (constant time, no scan)
+                self._forget(next(iter(self.first_seen)))
+            self.first_seen[src_ip] = now
+        elif now - first_seen > self.time_window:
+            # Outside the time window - start over
+            self.first_seen[src_ip] = now
+        else:
+            seen = self.port_bitmap[src_ip]
+            if seen.__class__ is int:
+                if seen == dst_port:
+                    return 0
+                # Second distinct port - switch to a bitmap
+                bitmap = self.port_bitmap[src_ip] = bytearray(PORT_BITMAP_BYTES)
+                bitmap[seen >> 3] |= 1 << (seen & 7)
+            elif seen is None:
+                # Reset after an alert - no ports in this window yet
+                self.port_bitmap[src_ip] = dst_port
+                self.port_count[src_ip] = 1
+                return 1
+            else:
+                bitmap = seen
+            
+            # Set the port's bit, counting it only the first time
+            index = dst_port >> 3
+            mask = 1 << (dst_port & 7)
+            if bitmap[index] & mask:
+                return 0
+            bitmap[index] |= mask
+            count = self.port_count[src_ip] + 1
+            self.port_count[src_ip] = count
+            return count
+        
+        self.port_bitmap[src_ip] = dst_port
+        self.port_count[src_ip] = 1
+        return 1
+    
+    def ports(self, src_ip):
+        """List the ports seen from a source in its current window"""
+        seen = self.port_bitmap.get(src_ip)
+        if seen is None:
+            return []
+        if seen.__class__ is int:
+            return [seen]
+        return [
+            index * 8 + bit
+            for index, byte in enumerate(seen) if byte
+            for bit in range(8) if byte & (1 << bit)
+        ]
+    
+    def reset(self, src_ip, now):
+        """Start a fresh window for a source (e.g. after alerting)"""
+        if src_ip in self.port_bitmap:
+            self.port_bitmap[src_ip] = None
+            self.port_count[src_ip] = 0
+            self.first_seen[src_ip] = now
+    
+    def prune(self, now):
+        """Forget sources whose tracking window has expired"""
+        expired = [
+            src_ip for src_ip, first_seen in self.first_seen.items()
+            if now - first_seen > self.time_window
+        ]
+        for src_ip in expired:
+            self._forget(src_ip)
+    
+    def _forget(self, src_ip):
+        del self.first_seen[src_ip]
+        del self.port_count[src_ip]
+        del self.port_bitmap[src_ip]
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Socket Table - Kernel socket listing over netlink (Linux)
+Dumps TCP/UDP sockets with NETLINK_SOCK_DIAG instead of parsing /proc/net/*
+"""
+
+import os
+import socket
+import struct
+from collections import namedtuple
+
+# linux/netlink.h, linux/sock_diag.h, linux/inet_diag.h
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+# struct nlmsghdr: length, type, flags, sequence, port id
+NLMSG_HDR = struct.Struct('=IHHII')
+
+# struct inet_diag_req_v2: family, protocol, ext, pad, states, zeroed inet_diag_sockid
+INET_DIAG_REQ = struct.Struct('=BBBxI48x')
+
+# struct inet_diag_msg: family, state, timer, retrans, sport, dport (big endian),
+# src, dst, [if, cookie, expires, rqueue, wqueue], uid, inode
+INET_DIAG_MSG = struct.Struct('=BB2x2s2s16s16s24xII')
+
+# Kernel TCP states, named like psutil
+TCP_STATES = {
+    1: 'ESTABLISHED', 2: 'SYN_SENT', 3: 'SYN_RECV', 4: 'FIN_WAIT1',
+    5: 'FIN_WAIT2', 6: 'TIME_WAIT', 7: 'CLOSE', 8: 'CLOSE_WAIT',
+    9: 'LAST_ACK', 10: 'LISTEN', 11: 'CLOSING', 12: 'SYN_RECV',
+}
+
+# Same shape as psutil.net_connections() entries
+Address = namedtuple('Address', ['ip', 'port'])
+Connection = namedtuple('Connection', ['fd', 'family', 'type', 'laddr', 'raddr', 'status', 'pid'])
+
+QUERIES = [
+    (socket.AF_INET, socket.IPPROTO_TCP, socket.SOCK_STREAM),
+    (socket.AF_INET6, socket.IPPROTO_TCP, socket.SOCK_STREAM),
+    (socket.AF_INET, socket.IPPROTO_UDP, socket.SOCK_DGRAM),
+    (socket.AF_INET6, socket.IPPROTO_UDP, socket.SOCK_DGRAM),
+]
+
+
+def decode_address(family, raw_ip, raw_port):
+    """Decode an address from an inet_diag_sockid (empty tuple if unset)"""
+    port = int.from_bytes(raw_port, 'big')
+    if not port:
+        return ()
+    if family == socket.AF_INET:
+        return Address(socket.inet_ntop(family, raw_ip[:4]), port)
+    return Address(socket.inet_ntop(family, raw_ip), port)
+
+
+class SocketTable:
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG)
+        self._seq = 0
+        
+        # Socket inode -> owning pid (None if unknown), rebuilt when new inodes show up
+        self._inode_pids = {}
+    
+    def dump(self, family, protocol):
+        """Yield (family, state, src, sport, dst, dport, inode) for all sockets of one kind"""
+        self._seq += 1
+        request = INET_DIAG_REQ.pack(family, protocol, 0, 0xFFFFFFFF)
+        header = NLMSG_HDR.pack(
+            NLMSG_HDR.size + len(request), SOCK_DIAG_BY_FAMILY,
+            NLM_F_REQUEST | NLM_F_DUMP, self._seq, 0
+        )
+        self.sock.sendto(header + request, (0, 0))
+        
+        while True:
+            data = self.sock.recv(1 << 16)
+            offset = 0
+            while offset + NLMSG_HDR.size <= len(data):
+                length, msg_type, _, _, _ = NLMSG_HDR.unpack_from(data, offset)
+                if msg_type == NLMSG_DONE:
+                    return
+                if msg_type == NLMSG_ERROR:
+                    error = -struct.unpack_from('=i', data, offset + NLMSG_HDR.size)[0]
+                    raise OSError(error, os.strerror(error))
+                
+                fields = INET_DIAG_MSG.unpack_from(data, offset + NLMSG_HDR.size)
+                msg_family, state, sport, dport, src, dst, _, inode = fields
+                yield msg_family, state, src, sport, dst, dport, inode
+                
+                # Messages are 4-byte aligned
+                offset += (length + 3) & ~3
+    
+    def scan_socket_owners(self):
+        """Map socket inodes to pids by reading /proc/<pid>/fd links"""
+        inode_pids = {}
+        for entry in os.scandir('/proc'):
+            if not entry.name.isdigit():
+                continue
+            pid = int(entry.name)
+            try:
+                for fd in os.scandir(f'/proc/{pid}/fd'):
+                    try:
+                        target = os.readlink(fd.path)
+                    except OSError:
+                        continue
+                    if target.startswith('socket:['):
+                        inode_pids[int(target[8:-1])] = pid
+            except OSError:
+                continue  # Process exited or no permission
+        return inode_pids
+    
+    def connections(self):
+        """List all TCP/UDP sockets, like psutil.net_connections(kind='inet')"""
+        sockets = []
+        for family, protocol, sock_type in QUERIES:
+            for msg_family, state, src, sport, dst, dport, inode in self.dump(family, protocol):
+                if sock_type == socket.SOCK_STREAM:
+                    status = TCP_STATES.get(state, 'NONE')
+                else:
+                    status = 'NONE'
+                sockets.append((
+                    msg_family, sock_type,
+                    decode_address(msg_family, src, sport),
+                    decode_address(msg_family, dst, dport),
+                    status, inode
+                ))
+        
+        # Only walk /proc when sockets we haven't resolved before appear
+        if any(inode and inode not in self._inode_pids for *_, inode in sockets):
+            inode_pids = self.scan_socket_owners()
+            for *_, inode in sockets:
+                inode_pids.setdefault(inode, None)
+            self._inode_pids = inode_pids
+        
+        inode_pids = self._inode_pids
+        return [
+            Connection(-1, family, sock_type, laddr, raddr, status, inode_pids.get(inode))
+            for family, sock_type, laddr, raddr, status, inode in sockets
+        ]
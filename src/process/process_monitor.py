@@ -5,156 +5,344 @@ Monitors running processes for suspicious activity
 """
 
 import os
+import re
 import sys
 import time
 import psutil
-from datetime import datetime
-from collections import defaultdict
+from array import array
+
+try:
+    import ahocorasick  # pyahocorasick, optional
+except ImportError:
+    ahocorasick = None
 
 # Add parent directory to path for alert system
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from network.alert_system import AlertSystem
 
+# Linux exposes per-process stats in /proc; read them directly instead of through psutil
+PROC_SCAN = sys.platform.startswith('linux')
+if PROC_SCAN:
+    CLK_TCK = os.sysconf('SC_CLK_TCK')
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+# Per-cycle status line
+SUMMARY_FORMAT = "[{}] Processes: {} | CPU: {:.1f}% | Memory: {:.1f}% | Available: {:.2f} GB\n"
+
+
+def read_proc_file(path):
+    """Read a small /proc file without a buffered file object"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, 4096)
+    finally:
+        os.close(fd)
+
+
+def update_counters(pids, readings, threshold, counters, alert_threshold):
+    """
+    Advance consecutive-high counters for one metric
+    
+    Returns the new counters (only pids still over the threshold; everyone else
+    resets) and the indices of readings that should alert. Alerting pids restart at 0.
+    """
+    updated = {}
+    alerts = []
+    for i, value in enumerate(readings):
+        if value > threshold:
+            pid = pids[i]
+            count = counters.get(pid, 0) + 1
+            if count >= alert_threshold:
+                alerts.append(i)
+                count = 0  # Reset counter after alert
+            updated[pid] = count
+    return updated, alerts
+
 
 class ProcessMonitor:
-    def __init__(self, log_dir='logs'):
+    def __init__(self, log_dir='logs', verbose=True):
         self.log_dir = log_dir
+        self.verbose = verbose  # Log every new process, not just alerts
         self.alert_system = AlertSystem(log_dir=log_dir)
+        self.log_writer = self.alert_system.log_writer
         
         # Ensure log directory exists
         os.makedirs(self.log_dir, exist_ok=True)
         
         # Track known processes to detect new ones
         self.known_processes = set()
-        self.suspicious_names = [
-            'nc', 'netcat', 'nmap', 'masscan', 'hping',  # Network scanning tools
+        
+        # pid -> psutil.Process, reused across cycles so cpu_percent has a baseline
+        self._processes = {}
+        self._process_attrs = ['pid', 'name', 'cpu_percent', 'memory_percent']
+        
+        # /proc scan state: pid -> (start time, cpu ticks, read time)
+        self._cpu_times = {}
+        self._total_memory = psutil.virtual_memory().total
+        
+        # Netcat, matched by exact name ('nc' as a substring would hit 'sync', 'rcu_...')
+        self.suspicious_exact_names = frozenset([
+            'nc', 'ncat', 'nc.openbsd', 'nc.traditional',
+        ])
+        # Patterns matched anywhere in the name
+        self.suspicious_substrings = (
+            'netcat', 'nmap', 'masscan', 'hping',        # Network scanning tools
             'metasploit', 'msfconsole', 'armitage',      # Exploitation frameworks
             'mimikatz', 'procdump', 'pwdump',            # Credential dumpers
-            'keylogger', 'logger',                        # Keyloggers
+            'keylogger', 'logger',                       # Keyloggers
             'cryptominer', 'xmrig', 'minergate',         # Crypto miners
             'backdoor', 'trojan', 'rootkit',             # Malware
-        ]
+        )
+        self.suspicious_names = sorted(self.suspicious_exact_names) + list(self.suspicious_substrings)
+        
+        # All substring patterns in one automaton: a single pass per name instead of one scan per pattern
+        self._suspicious_automaton = None
+        if ahocorasick is not None:
+            self._suspicious_automaton = ahocorasick.Automaton()
+            for pattern in self.suspicious_substrings:
+                self._suspicious_automaton.add_word(pattern, pattern)
+            self._suspicious_automaton.make_automaton()
+        
+        # Fallback: one compiled alternation instead of a Python loop over patterns
+        self._suspicious_re = re.compile('|'.join(re.escape(s) for s in self.suspicious_substrings))
+        
+        # Process name -> match result; names repeat a lot (workers, shells, kernel threads)
+        self._suspicious_cache = {}
+        self.max_cached_names = 4096
         
         # Resource usage thresholds
         self.cpu_threshold = 80  # CPU usage percentage
         self.memory_threshold = 80  # Memory usage percentage
         
-        # Track high resource processes
-        self.high_resource_tracker = defaultdict(int)
-        self.alert_threshold = 3  # Alert after 3 consecutive high readings
+        # Consecutive high readings per pid (only pids currently over a threshold)
+        self.high_cpu_tracker = {}
+        self.high_memory_tracker = {}
+        # CPU readings average over the whole resource interval, so one high reading is sustained load;
+        # memory readings are instantaneous, so require consecutive highs to ignore momentary spikes
+        self.alert_threshold = 1
+        self.memory_alert_threshold = 2
+        self.resource_interval_mult = 3  # Check resources every 3rd scan
+        
+        # Prime system-wide CPU usage so later reads don't block
+        psutil.cpu_percent(interval=None)
         
-    def log_process_event(self, event_type, message):
-        """Log process events"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    def log_process_event(self, timestamp, event_type, message, *args):
+        """Log process events (timestamp is computed once per scan; message is a %-format for args)"""
+        if args:
+            message = message % args
         log_message = f"[{timestamp}] {event_type}: {message}"
         
         log_file = os.path.join(self.log_dir, 'process_monitor.log')
-        with open(log_file, 'a') as f:
-            f.write(log_message + '\n')
+        self.log_writer.write(log_file, f"{log_message}\n".encode())
+    
+    def close(self):
+        """Flush buffered log lines to disk"""
+        self.log_writer.close()
     
     def is_suspicious_name(self, process_name):
         """Check if process name matches suspicious patterns"""
-        process_name_lower = process_name.lower()
-        for suspicious in self.suspicious_names:
-            if suspicious in process_name_lower:
-                return True
-        return False
+        suspicious = self._suspicious_cache.get(process_name)
+        if suspicious is None:
+            suspicious = self._match_suspicious(process_name.lower())
+            if len(self._suspicious_cache) >= self.max_cached_names:
+                self._suspicious_cache.clear()
+            self._suspicious_cache[process_name] = suspicious
+        return suspicious
+    
+    def _match_suspicious(self, process_name_lower):
+        """Run the pattern matcher on a lowercased name"""
+        # Exact names first: one hash lookup (Windows names end in .exe)
+        executable = process_name_lower[:-4] if process_name_lower.endswith('.exe') else process_name_lower
+        if executable in self.suspicious_exact_names:
+            return True
+        
+        if self._suspicious_automaton is not None:
+            return next(self._suspicious_automaton.iter(process_name_lower), None) is not None
+        return self._suspicious_re.search(process_name_lower) is not None
+    
+    def check_new_processes(self, timestamp, proc):
+        """Log and vet a process that wasn't running last cycle"""
+        pid = proc.pid
+        with proc.oneshot():
+            name = proc.name()
+            suspicious = self.is_suspicious_name(name)
+            if not (self.verbose or suspicious):
+                return  # Nothing to log or alert
+            
+            # Username (a SID lookup on Windows) and command line are only fetched here
+            try:
+                username = proc.username()
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                username = '?'
+            try:
+                cmdline = ' '.join(proc.cmdline())
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                cmdline = ''
+        
+        if self.verbose:
+            self.log_process_event(
+                timestamp, "NEW_PROCESS",
+                "PID: %d, Name: %s, User: %s, Command: %.100s", pid, name, username, cmdline
+            )
+        
+        # Check if suspicious
+        if suspicious:
+            self.alert_system.send_alert(
+                f"SUSPICIOUS PROCESS DETECTED | Name: {name} | PID: {pid} | "
+                f"User: {username} | Command: {cmdline[:100]}",
+                severity="SUSPICIOUS_PROCESS",
+                play_sound=True
+            )
     
-    def check_new_processes(self):
-        """Detect newly started processes"""
-        current_processes = set()
+    def check_resource_usage(self, timestamp, pids, names, cpu_readings, memory_readings):
+        """Check CPU and memory readings gathered by a scan (parallel arrays)"""
+        self.high_cpu_tracker, cpu_alerts = update_counters(
+            pids, cpu_readings, self.cpu_threshold, self.high_cpu_tracker, self.alert_threshold
+        )
+        self.high_memory_tracker, memory_alerts = update_counters(
+            pids, memory_readings, self.memory_threshold, self.high_memory_tracker, self.memory_alert_threshold
+        )
         
-        for proc in psutil.process_iter(['pid', 'name', 'username', 'cmdline']):
+        # Alert on high CPU usage
+        for i in cpu_alerts:
+            pid = pids[i]
+            name = names[i]
+            cpu_percent = cpu_readings[i]
+            self.log_process_event(
+                timestamp, "HIGH_CPU",
+                "PID: %d, Name: %s, CPU: %.1f%%", pid, name, cpu_percent
+            )
+            
+            self.alert_system.send_alert(
+                f"HIGH CPU USAGE | Process: {name} (PID: {pid}) | "
+                f"CPU: {cpu_percent:.1f}% (threshold: {self.cpu_threshold}%)",
+                severity="HIGH_CPU",
+                play_sound=False  # Don't play sound for resource alerts
+            )
+        
+        # Alert on high memory usage
+        for i in memory_alerts:
+            pid = pids[i]
+            name = names[i]
+            memory_percent = memory_readings[i]
+            self.log_process_event(
+                timestamp, "HIGH_MEMORY",
+                "PID: %d, Name: %s, Memory: %.1f%%", pid, name, memory_percent
+            )
+            
+            self.alert_system.send_alert(
+                f"HIGH MEMORY USAGE | Process: {name} (PID: {pid}) | "
+                f"Memory: {memory_percent:.1f}% (threshold: {self.memory_threshold}%)",
+                severity="HIGH_MEMORY",
+                play_sound=False
+            )
+    
+    def _psutil_scan(self, current_processes):
+        """Gather name, CPU and memory readings column-wise through psutil"""
+        pids = array('i')
+        names = []
+        cpu_readings = array('d')
+        memory_readings = array('d')
+        
+        processes = self._processes
+        attrs = self._process_attrs
+        for pid in current_processes:
             try:
-                pid = proc.info['pid']
-                name = proc.info['name']
-                username = proc.info['username']
-                cmdline = ' '.join(proc.info['cmdline']) if proc.info['cmdline'] else ''
+                proc = processes.get(pid)
+                if proc is None:
+                    proc = processes[pid] = psutil.Process(pid)
                 
-                current_processes.add(pid)
+                # as_dict() reads all attrs under oneshot()
+                info = proc.as_dict(attrs)
                 
-                # Check for new processes
-                if pid not in self.known_processes:
-                    self.log_process_event(
-                        "NEW_PROCESS",
-                        f"PID: {pid}, Name: {name}, User: {username}, Command: {cmdline[:100]}"
-                    )
-                    
-                    # Check if suspicious
-                    if self.is_suspicious_name(name):
-                        self.alert_system.send_alert(
-                            f"SUSPICIOUS PROCESS DETECTED | Name: {name} | PID: {pid} | "
-                            f"User: {username} | Command: {cmdline[:100]}",
-                            severity="SUSPICIOUS_PROCESS",
-                            play_sound=True
-                        )
-                    
             except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                processes.pop(pid, None)
                 continue
+            
+            pids.append(pid)
+            names.append(info['name'])
+            cpu_readings.append(info['cpu_percent'] or 0.0)
+            memory_readings.append(info['memory_percent'] or 0.0)
         
-        # Update known processes
-        self.known_processes = current_processes
+        return pids, names, cpu_readings, memory_readings
     
-    def check_resource_usage(self):
-        """Monitor CPU and memory usage"""
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+    def _linux_scan(self, current_processes):
+        """Gather the same readings as _psutil_scan straight from /proc/<pid>/stat and statm"""
+        pids = array('i')
+        names = []
+        cpu_readings = array('d')
+        memory_readings = array('d')
+        
+        now = time.monotonic()
+        previous = self._cpu_times
+        cpu_times = {}
+        memory_scale = PAGE_SIZE * 100 / self._total_memory
+        
+        for pid in current_processes:
             try:
-                pid = proc.info['pid']
-                name = proc.info['name']
-                cpu_percent = proc.info['cpu_percent']
-                memory_percent = proc.info['memory_percent']
-                
-                # Check for high CPU usage
-                if cpu_percent > self.cpu_threshold:
-                    self.high_resource_tracker[f"cpu_{pid}"] += 1
-                    
-                    if self.high_resource_tracker[f"cpu_{pid}"] >= self.alert_threshold:
-                        self.log_process_event(
-                            "HIGH_CPU",
-                            f"PID: {pid}, Name: {name}, CPU: {cpu_percent:.1f}%"
-                        )
-                        
-                        self.alert_system.send_alert(
-                            f"HIGH CPU USAGE | Process: {name} (PID: {pid}) | "
-                            f"CPU: {cpu_percent:.1f}% (threshold: {self.cpu_threshold}%)",
-                            severity="HIGH_CPU",
-                            play_sound=False  # Don't play sound for resource alerts
-                        )
-                        
-                        # Reset counter after alert
-                        self.high_resource_tracker[f"cpu_{pid}"] = 0
-                else:
-                    # Reset counter if below threshold
-                    self.high_resource_tracker[f"cpu_{pid}"] = 0
-                
-                # Check for high memory usage
-                if memory_percent > self.memory_threshold:
-                    self.high_resource_tracker[f"mem_{pid}"] += 1
-                    
-                    if self.high_resource_tracker[f"mem_{pid}"] >= self.alert_threshold:
-                        self.log_process_event(
-                            "HIGH_MEMORY",
-                            f"PID: {pid}, Name: {name}, Memory: {memory_percent:.1f}%"
-                        )
-                        
-                        self.alert_system.send_alert(
-                            f"HIGH MEMORY USAGE | Process: {name} (PID: {pid}) | "
-                            f"Memory: {memory_percent:.1f}% (threshold: {self.memory_threshold}%)",
-                            severity="HIGH_MEMORY",
-                            play_sound=False
-                        )
-                        
-                        self.high_resource_tracker[f"mem_{pid}"] = 0
-                else:
-                    self.high_resource_tracker[f"mem_{pid}"] = 0
-                    
+                stat = read_proc_file(f'/proc/{pid}/stat')
+                statm = read_proc_file(f'/proc/{pid}/statm')
+            except OSError:
+                continue  # Process exited
+            
+            # Name is in parentheses and may itself contain spaces or ')'
+            name_end = stat.rindex(b')')
+            fields = stat[name_end + 2:].split()
+            ticks = int(fields[11]) + int(fields[12])  # utime + stime
+            started = fields[19]
+            cpu_times[pid] = (started, ticks, now)
+            
+            # CPU % since the last scan, like psutil's cpu_percent(); 0 on first sight
+            last = previous.get(pid)
+            if last is not None and last[0] == started and now > last[2]:
+                cpu_percent = (ticks - last[1]) / CLK_TCK / (now - last[2]) * 100
+            else:
+                cpu_percent = 0.0
+            
+            pids.append(pid)
+            names.append(stat[stat.index(b'(') + 1:name_end].decode(errors='replace'))
+            cpu_readings.append(cpu_percent)
+            memory_readings.append(int(statm.split()[1]) * memory_scale)  # Resident pages
+        
+        self._cpu_times = cpu_times
+        return pids, names, cpu_readings, memory_readings
+    
+    def scan_once(self, check_resources=True):
+        """Single pass over all processes: detect new ones and optionally check resource usage"""
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        current_processes = set(psutil.pids())
+        
+        # Iterate pids directly instead of process_iter(), which re-checks
+        # every cached process for pid reuse on older psutil versions
+        processes = self._processes
+        for pid in list(processes.keys() - current_processes):
+            del processes[pid]
+        
+        if check_resources:
+            if PROC_SCAN:
+                readings = self._linux_scan(current_processes)
+            else:
+                readings = self._psutil_scan(current_processes)
+            self.check_resource_usage(timestamp, *readings)
+        
+        # New processes in one set difference; usually empty
+        for pid in current_processes - self.known_processes:
+            try:
+                proc = processes.get(pid)
+                if proc is None:
+                    proc = processes[pid] = psutil.Process(pid)
+                self.check_new_processes(timestamp, proc)
             except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                processes.pop(pid, None)
                 continue
+        
+        # Update known processes
+        self.known_processes = current_processes
     
     def get_process_summary(self):
         """Get summary of running processes"""
-        total_processes = len(list(psutil.process_iter()))
-        cpu_percent = psutil.cpu_percent(interval=0.1)
+        total_processes = len(self.known_processes)  # pids from the latest scan
+        cpu_percent = psutil.cpu_percent(interval=None)  # Usage since the previous call
         memory = psutil.virtual_memory()
         
         return {
@@ -169,6 +357,7 @@ class ProcessMonitor:
         print("🔍 PROCESS MONITOR - ACTIVE")
         print("="*70)
         print(f"Monitoring system processes every {interval} seconds")
+        print(f"Checking resource usage every {interval * self.resource_interval_mult} seconds")
         print(f"CPU threshold: {self.cpu_threshold}%")
         print(f"Memory threshold: {self.memory_threshold}%")
         print(f"Tracking {len(self.suspicious_names)} suspicious process patterns")
@@ -176,31 +365,42 @@ class ProcessMonitor:
         print("\nPress Ctrl+C to stop\n")
         
         # Initialize known processes
-        self.known_processes = {proc.info['pid'] for proc in psutil.process_iter(['pid'])}
+        self.known_processes = set(psutil.pids())
+        
+        format_summary = SUMMARY_FORMAT.format
+        write = sys.stdout.write
         
+        tick = 0
+        deadline = time.monotonic()
         try:
             while True:
-                # Check for new processes
-                self.check_new_processes()
-                
-                # Check resource usage
-                self.check_resource_usage()
+                # New processes every scan, resource usage every few scans
+                self.scan_once(check_resources=tick % self.resource_interval_mult == 0)
+                tick += 1
                 
                 # Display summary
                 summary = self.get_process_summary()
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] "
-                      f"Processes: {summary['total_processes']} | "
-                      f"CPU: {summary['cpu_percent']:.1f}% | "
-                      f"Memory: {summary['memory_percent']:.1f}% | "
-                      f"Available: {summary['memory_available_gb']:.2f} GB")
+                write(format_summary(
+                    time.strftime('%H:%M:%S'), summary['total_processes'],
+                    summary['cpu_percent'], summary['memory_percent'],
+                    summary['memory_available_gb']
+                ))
                 
-                time.sleep(interval)
+                # Sleep until the next tick so scan time doesn't stretch the period
+                deadline += interval
+                sleep_for = deadline - time.monotonic()
+                if sleep_for > 0:
+                    time.sleep(sleep_for)
+                else:
+                    deadline = time.monotonic()  # Fell behind; skip missed ticks
                 
         except KeyboardInterrupt:
+            self.close()
             print("\n\n🛑 Process Monitor Stopped")
             print(f"Logs saved to: {os.path.abspath(self.log_dir)}/process_monitor.log")
 
 
 if __name__ == "__main__":
-    monitor = ProcessMonitor()
+    # --quiet: log only suspicious new processes and resource alerts
+    monitor = ProcessMonitor(verbose='--quiet' not in sys.argv[1:])
     monitor.monitor()